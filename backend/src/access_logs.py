@@ -0,0 +1,64 @@
+import atexit
+import logging
+import queue
+import threading
+from datetime import UTC, datetime
+
+from .db import insert_many
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+# rows beyond this are dropped while the database can't keep up
+MAX_QUEUED = 10_000
+
+# (accessed_at, url_id) in the INSERT parameter order
+_queue: queue.Queue[tuple[datetime, int]] = queue.Queue(maxsize=MAX_QUEUED)
+_writer: threading.Thread | None = None
+_writer_lock = threading.Lock()
+
+
+def _write_batches() -> None:
+    while True:
+        batch = [_queue.get()]
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            # urls deleted since the click are skipped instead of failing the batch
+            insert_many(
+                "INSERT INTO access_logs (url_id, accessed_at) SELECT id, %s FROM urls WHERE id = %s;",
+                batch,
+            )
+        except Exception:
+            log.exception("Failed to write %d access logs", len(batch))
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+
+def log_access(url_id: int) -> None:
+    """Queue an access log row, written in batches by a background thread"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = threading.Thread(
+                    target=_write_batches, name="access-logs", daemon=True
+                )
+                _writer.start()
+    try:
+        _queue.put_nowait((datetime.now(UTC), url_id))
+    except queue.Full:
+        log.warning("Access log queue full, dropping access to url %s", url_id)
+
+
+def flush() -> None:
+    """Block until every queued access log has been written"""
+    if _writer is not None:
+        _queue.join()
+
+
+atexit.register(flush)
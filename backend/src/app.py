@@ -2,11 +2,25 @@ import logging
 import sys
 from http import HTTPStatus
 
-import pendulum
-from flask import Flask, jsonify, request, redirect, url_for
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    request,
+    redirect,
+    stream_with_context,
+)
 from flasgger import Swagger
-from .db import init_db, select_all, select_one, insert, delete
-from .utils import normalize_url, generate_random_slug, build_tinyurl
+from flask_compress import Compress
+from . import access_logs, cache
+from .db import init_db, select_all, select_one, select_chunks, insert, delete
+from .utils import (
+    normalize_url,
+    encode_slug,
+    build_tinyurl,
+    build_links,
+    dumps_json,
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -23,7 +37,15 @@ app.config["SWAGGER"] = {
     "uiversion": 3,
 }
 
+app.config["COMPRESS_MIMETYPES"] = ["application/json"]
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+# flask-compress can't stream gzip, used by the /urls listing
+app.config["COMPRESS_ALGORITHM_STREAMING"] = ["br", "deflate"]
+app.config["COMPRESS_LEVEL"] = 4
+app.config["COMPRESS_BR_LEVEL"] = 4
+
 swagger = Swagger(app)
+compress = Compress(app)
 
 init_db()
 
@@ -173,34 +195,22 @@ def new_url():
         body = request.get_json()
         url, expires_at = body["url"], body["expiry_date"]
         normalized_url = normalize_url(url)
-        if existing_tinyurl := select_one(
-            "SELECT slug FROM urls WHERE normalized_url = %s", normalized_url
-        ):
-            slug = existing_tinyurl["slug"]
-            tiny_url = build_tinyurl(slug)
-            links = {
-                "redirect": tiny_url,
-                "stats": url_for("get_url_stats", slug=slug, _external=True),
-                "delete": url_for("delete_url", slug=slug, _external=True),
-            }
-            return jsonify(url=tiny_url, links=links), HTTPStatus.OK
-
-        slug = generate_random_slug(url)
-        while select_one("SELECT 1 AS ok FROM urls WHERE slug = %s", slug):
-            slug = generate_random_slug(url + slug)
-        insert(
-            "INSERT INTO urls (slug, normalized_url, created_at, expires_at) VALUES (%s, %s, NOW(), %s);",
-            slug,
+        # slugs are derived from the id so they never collide
+        url_id = select_one("SELECT nextval('urls_id_seq') AS id;")["id"]
+        # returns the existing slug when the url was already shortened
+        tinyurl = insert(
+            "INSERT INTO urls (id, slug, normalized_url, created_at, expires_at) VALUES (%s, %s, %s, NOW(), %s) "
+            "ON CONFLICT (normalized_url) DO UPDATE SET normalized_url = EXCLUDED.normalized_url "
+            "RETURNING slug, (xmax = 0) AS inserted;",
+            url_id,
+            encode_slug(url_id),
             normalized_url,
             expires_at,
         )
-        tiny_url = build_tinyurl(slug)
-        links = {
-            "redirect": tiny_url,
-            "stats": url_for("get_url_stats", slug=slug, _external=True),
-            "delete": url_for("delete_url", slug=slug, _external=True),
-        }
-        return jsonify(url=tiny_url, links=links), HTTPStatus.CREATED
+        slug = tinyurl["slug"]
+        links = build_links(slug)
+        status = HTTPStatus.CREATED if tinyurl["inserted"] else HTTPStatus.OK
+        return jsonify(url=links["redirect"], links=links), status
     except Exception as e:
         log.exception("Error creating URL")
         return jsonify(error=str(e)), HTTPStatus.INTERNAL_SERVER_ERROR
@@ -259,17 +269,19 @@ def get_url_stats(slug: str):
               type: string
     """
     try:
-        if tinyurl := select_one("SELECT * FROM urls WHERE slug = %s;", slug):
-            acceses = select_all(
-                "SELECT accessed_at FROM access_logs WHERE url_id = %s;", tinyurl["id"]
-            )
+        if tinyurl := select_one(
+            "SELECT slug, normalized_url, created_at, expires_at, "
+            "ARRAY(SELECT accessed_at FROM access_logs WHERE url_id = urls.id) AS accessed_at "
+            "FROM urls WHERE slug = %s;",
+            slug,
+        ):
             return (
                 jsonify(
                     tinyurl=build_tinyurl(tinyurl["slug"]),
                     normalized_url=tinyurl["normalized_url"],
                     created_at=tinyurl["created_at"],
                     expires_at=tinyurl["expires_at"],
-                    accessed_at=[access["accessed_at"] for access in acceses],
+                    accessed_at=tinyurl["accessed_at"],
                 ),
                 HTTPStatus.OK,
             )
@@ -316,8 +328,25 @@ def get_urls():
               type: string
     """
     try:
-        urls = select_all("SELECT * FROM urls")
-        return jsonify(urls), HTTPStatus.OK
+        chunks = select_chunks(
+            "SELECT slug, normalized_url, created_at, expires_at FROM urls;"
+        )
+        # run the query now so failures still get a 500
+        first = next(chunks, [])
+
+        def stream():
+            try:
+                # each chunk is serialized as a list, brackets stripped
+                yield b"[" + dumps_json(first)[1:-1]
+                for chunk in chunks:
+                    yield b"," + dumps_json(chunk)[1:-1]
+                yield b"]"
+            finally:
+                chunks.close()
+
+        return Response(
+            stream_with_context(stream()), mimetype="application/json"
+        ), HTTPStatus.OK
     except Exception as e:
         log.exception("Error listing URLs")
         return jsonify(error=str(e)), HTTPStatus.INTERNAL_SERVER_ERROR
@@ -356,13 +385,14 @@ def delete_url(slug: str):
               type: string
     """
     try:
-        if tinyurl := select_one(
-            "SELECT slug, created_at, normalized_url FROM urls WHERE slug = %s;", slug
+        if tinyurl := delete(
+            "DELETE FROM urls WHERE slug = %s RETURNING slug, created_at, normalized_url;",
+            slug,
         ):
-            delete_result = delete("DELETE from urls WHERE slug = %s", tinyurl["slug"])
+            cache.delete_url(tinyurl["slug"])
             return jsonify(
                 tinyurl=tinyurl,
-                deleted=delete_result,
+                deleted=True,
             ), HTTPStatus.OK
         else:
             return jsonify(error="URL not found"), HTTPStatus.NOT_FOUND
@@ -411,20 +441,30 @@ def redirect_url(slug: str):
               type: string
     """
     try:
+        if cached := cache.get_url(slug):
+            url_id, normalized_url = cached
+            access_logs.log_access(url_id)
+            return redirect(normalized_url)
+
+        # lookup and access log in one round trip, the log is skipped when expired
         tinyurl = select_one(
-            "SELECT id, normalized_url, expires_at FROM urls WHERE slug = %s;", slug
+            "WITH u AS ("
+            "SELECT id, normalized_url, expires_at <= NOW() AS expired, "
+            "FLOOR(EXTRACT(EPOCH FROM expires_at - NOW()))::bigint AS expires_in "
+            "FROM urls WHERE slug = %s"
+            "), log AS ("
+            "INSERT INTO access_logs (url_id, accessed_at) "
+            "SELECT id, NOW() FROM u WHERE expired IS NOT TRUE"
+            ") SELECT id, normalized_url, expired, expires_in FROM u;",
+            slug,
         )
         if not tinyurl:
             return jsonify(error="URL not found"), HTTPStatus.NOT_FOUND
-
-        if tinyurl["expires_at"] and tinyurl["expires_at"] < pendulum.now():
+        if tinyurl["expired"]:
             return jsonify(error="URL expired"), HTTPStatus.GONE
-
-        insert(
-            "INSERT INTO access_logs (url_id, accessed_at) VALUES (%s, NOW());",
-            tinyurl["id"],
-        )
-        return redirect(tinyurl["normalized_url"])
+        url_id, normalized_url = tinyurl["id"], tinyurl["normalized_url"]
+        cache.set_url(slug, url_id, normalized_url, tinyurl["expires_in"])
+        return redirect(normalized_url)
     except Exception as e:
         log.exception("Error redirecting URL")
         return jsonify(error=str(e)), HTTPStatus.INTERNAL_SERVER_ERROR
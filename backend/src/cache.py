@@ -0,0 +1,69 @@
+import os
+import logging
+
+import redis
+
+log = logging.getLogger(__name__)
+
+# cache is disabled when REDIS_URL is not set
+REDIS_URL = os.environ.get("REDIS_URL")
+CACHE_TTL = 3600
+# a deleted slug is tombstoned so a redirect that read the row before the
+# delete can't put it back in the cache, slugs are never reused
+DELETED = "deleted"
+DELETED_TTL = 60
+
+# short timeouts so a stalled redis is a miss instead of a hung request
+client = (
+    redis.Redis.from_url(
+        REDIS_URL,
+        decode_responses=True,
+        socket_timeout=0.1,
+        socket_connect_timeout=0.1,
+    )
+    if REDIS_URL
+    else None
+)
+
+
+def _key(slug: str) -> str:
+    return f"url:{slug}"
+
+
+def get_url(slug: str) -> tuple[int, str] | None:
+    """Return (id, normalized_url) or None on miss"""
+    if client is None:
+        return None
+    try:
+        cached = client.get(_key(slug))
+    except redis.RedisError:
+        log.warning("Cache unavailable", exc_info=True)
+        return None
+    if cached is None or cached == DELETED:
+        return None
+    # normalized_url last since it may contain the separator
+    url_id, normalized_url = cached.split("|", 1)
+    return int(url_id), normalized_url
+
+
+def set_url(
+    slug: str, url_id: int, normalized_url: str, expires_in: int | None
+) -> None:
+    """Cache an unexpired url, never past its expiry so hits need no expiry check"""
+    ttl = CACHE_TTL if expires_in is None else min(CACHE_TTL, expires_in)
+    if client is None or ttl <= 0:
+        return
+    try:
+        # NX: never overwrite a tombstone
+        client.set(_key(slug), f"{url_id}|{normalized_url}", ex=ttl, nx=True)
+    except redis.RedisError:
+        log.warning("Cache unavailable", exc_info=True)
+
+
+def delete_url(slug: str) -> None:
+    if client is None:
+        return
+    try:
+        client.set(_key(slug), DELETED, ex=DELETED_TTL)
+    except redis.RedisError:
+        log.warning("Cache unavailable", exc_info=True)
@@ -1,3 +1,19 @@
-from .orm import init_db, select_all, select_one, insert, delete
+from .orm import (
+    init_db,
+    select_all,
+    select_one,
+    select_chunks,
+    insert,
+    insert_many,
+    delete,
+)
 
-__all__ = ["init_db", "select_all", "select_one", "insert", "delete"]
+__all__ = [
+    "init_db",
+    "select_all",
+    "select_one",
+    "select_chunks",
+    "insert",
+    "insert_many",
+    "delete",
+]
@@ -12,7 +12,8 @@ CREATE TABLE IF NOT EXISTS access_logs (
     accessed_at TIMESTAMPTZ DEFAULT NOW()
 );
 
-CREATE INDEX IF NOT EXISTS idx_urls_slug ON urls (slug);
-CREATE INDEX IF NOT EXISTS idx_urls_normalized_url ON urls (normalized_url);
+-- slug and normalized_url are already indexed by their UNIQUE constraints
+DROP INDEX IF EXISTS idx_urls_slug;
+DROP INDEX IF EXISTS idx_urls_normalized_url;
 CREATE INDEX IF NOT EXISTS idx_access_logs_url_id ON access_logs (url_id);
 CREATE INDEX IF NOT EXISTS idx_access_logs_accessed_at ON access_logs (accessed_at);
@@ -5,8 +5,8 @@ from contextlib import contextmanager
 from typing import Any, Generator
 from psycopg import Cursor
 
-import psycopg
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 
 log = logging.getLogger(__name__)
 
@@ -17,20 +17,32 @@ DATABASE_URL = (
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL not set")
 
+# seconds to wait for a connection before failing the request
+POOL_TIMEOUT = 2
+
+# one pool per process, opened by init_db. 16 leaves headroom over the
+# dockerfile's 4 request threads plus the access log writer
+POOL = ConnectionPool(
+    DATABASE_URL,
+    min_size=2,
+    max_size=16,
+    timeout=POOL_TIMEOUT,
+    kwargs={
+        "row_factory": dict_row,
+        "connect_timeout": 1,
+        "autocommit": True,
+        # prepare every statement on first use, pooled connections keep the plans
+        "prepare_threshold": 0,
+    },
+    open=False,
+)
+
 
 @contextmanager
 def db_cursor() -> Generator[Cursor, None, None]:
-    conn = psycopg.connect(
-        DATABASE_URL,
-        row_factory=dict_row,
-        connect_timeout=1,
-        autocommit=True,
-    )
-    try:
+    with POOL.connection() as conn:
         with conn.cursor() as cur:
             yield cur
-    finally:
-        conn.close()
 
 
 def select_one(query: str, *params: Any) -> dict[str, Any] | None:
@@ -45,6 +57,17 @@ def select_all(query: str, *params: Any) -> list[dict[str, Any]]:
         return cur.fetchall()
 
 
+def select_chunks(
+    query: str, *params: Any, size: int = 1000
+) -> Generator[list[dict[str, Any]], None, None]:
+    # server-side cursor, only `size` rows are held in memory at a time
+    with POOL.connection() as conn, conn.transaction():
+        with conn.cursor(name="select_chunks") as cur:
+            cur.execute(query, params or None)
+            while rows := cur.fetchmany(size):
+                yield rows
+
+
 def insert(query: str, *params: Any) -> dict[str, Any] | None:
     with db_cursor() as cur:
         cur.execute(query, params or None)
@@ -53,10 +76,19 @@ def insert(query: str, *params: Any) -> dict[str, Any] | None:
         return None
 
 
-def delete(query: str, *params: Any) -> dict[str, Any] | None:
+def insert_many(query: str, params_seq: list[tuple[Any, ...]]) -> None:
+    with db_cursor() as cur:
+        with cur.connection.transaction():
+            cur.executemany(query, params_seq)
+
+
+def delete(query: str, *params: Any) -> dict[str, Any] | bool | None:
+    # the RETURNING row if any, else whether a row was deleted
     with db_cursor() as cur:
         cur.execute(query, params or None)
-        return cur.statusmessage == "DELETE 1"
+        if cur.description:
+            return cur.fetchone()
+        return cur.rowcount > 0
 
 
 def init_db() -> None:
@@ -65,12 +97,13 @@ def init_db() -> None:
         raise FileNotFoundError(f"Schema file not found: {path}")
 
     ddl = path.read_text()
-    statements = [s.strip() for s in ddl.split(";") if s.strip()]
 
     try:
-        with db_cursor() as cur:
-            for stmt in statements:
-                cur.execute(stmt)
+        POOL.open(wait=True, timeout=POOL_TIMEOUT)
+        # whole schema in one round trip, rolled back as a unit on failure
+        with POOL.connection() as conn, conn.transaction():
+            # multi-statement queries can't be prepared
+            conn.execute(ddl, prepare=False)
         log.info("DB initialized")
     except Exception as e:
         log.error("Failed to initialize DB: %s", e)
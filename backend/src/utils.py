@@ -1,16 +1,24 @@
+import functools
 import string
-from random import Random
-from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode, ParseResult
-from flask import request
+from typing import Any
+from urllib.parse import urlparse, urlunparse, ParseResult
 
-BASE36_ALPHABET = string.ascii_lowercase + string.digits
+import orjson
+from flask import g, request
+from werkzeug.http import http_date
+
+MAX_URL_LENGTH = 4096  # longest url kept in the normalize_url cache
+BASE62_ALPHABET = string.digits + string.ascii_letters
+SLUG_ID_BITS = 40
+SLUG_LENGTH = 7  # 62**7 > 2**40
+_FEISTEL_HALF_BITS = SLUG_ID_BITS // 2
+_FEISTEL_MASK = (1 << _FEISTEL_HALF_BITS) - 1
+_FEISTEL_KEYS = (0x5BD1E, 0x3C6EF, 0xA54FF, 0x1F83D)
 
 
 def order_query(query: str) -> str:
-    query_pairs = parse_qsl(query, keep_blank_values=True)  # permissif
-    query_pairs.sort()
-    query = urlencode(query_pairs, doseq=True)
-    return query
+    # already percent-encoded, only the order of the pairs matters
+    return "&".join(sorted(pair for pair in query.split("&") if pair))
 
 
 def parse_url(raw_url: str) -> ParseResult:
@@ -25,7 +33,7 @@ def parse_url(raw_url: str) -> ParseResult:
     return parsed
 
 
-def normalize_url(url: str) -> str:
+def _normalize_parsed_url(url: str) -> str:
     parsed_url = parse_url(url)
     scheme = parsed_url.scheme
     netloc = parsed_url.netloc.lower()
@@ -36,11 +44,104 @@ def normalize_url(url: str) -> str:
     )
 
 
-def generate_random_slug(url: str, length: int = 8) -> str:
-    rd = Random()
-    rd.seed(url)
-    return "".join(rd.choice(BASE36_ALPHABET) for _ in range(length))
+def normalize_url(url: str) -> str:
+    # long urls bypass the cache so it can't pin arbitrarily large strings
+    if len(url) > MAX_URL_LENGTH:
+        return _normalize_url.__wrapped__(url)
+    return _normalize_url(url)
+
+
+def _scannable_url(url: str) -> bool:
+    # urllib handles whitespace and control chars
+    return url.isprintable() and not url.endswith(" ")
+
+
+def _scannable_netloc(netloc: str) -> bool:
+    # urllib handles IPv6 and IDN hosts
+    return netloc.isascii() and "[" not in netloc and "]" not in netloc
+
+
+def _normalize_scanned_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    scheme = scheme.lower()
+    if not sep or scheme not in ("http", "https") or not _scannable_url(url):
+        return _normalize_parsed_url(url)
+
+    rest, _, fragment = rest.partition("#")
+    rest, _, query = rest.partition("?")
+    slash = rest.find("/")
+    netloc, path = (rest, "/") if slash == -1 else (rest[:slash], rest[slash:])
+    if not _scannable_netloc(netloc):
+        return _normalize_parsed_url(url)
+    if not netloc:
+        raise ValueError("Malformed URL.")
+    # like urlunparse, drop an empty ;params from the last segment
+    if path.endswith(";") and path.find(";", path.rfind("/")) == len(path) - 1:
+        path = path[:-1]
+
+    normalized = f"{scheme}://{netloc.lower()}{path}"
+    if query := order_query(query):
+        normalized += "?" + query
+    if fragment:
+        normalized += "#" + fragment
+    return normalized
+
+
+@functools.lru_cache(maxsize=16384)
+def _normalize_url(url: str) -> str:
+    # common shape, already normalized: http(s)://host/path without query or fragment
+    if (
+        url.startswith(("https://", "http://"))
+        and "?" not in url
+        and "#" not in url
+        and not url.endswith(";")
+        and _scannable_url(url)
+    ):
+        start = url.index("://") + 3
+        slash = url.find("/", start)
+        netloc = url[start:] if slash == -1 else url[start:slash]
+        if netloc and _scannable_netloc(netloc) and netloc == netloc.lower():
+            return url if slash != -1 else url + "/"
+    return _normalize_scanned_url(url)
+
+
+def _feistel(n: int) -> int:
+    # bijection on 40-bit ints so consecutive ids don't give consecutive slugs
+    left, right = n >> _FEISTEL_HALF_BITS, n & _FEISTEL_MASK
+    for key in _FEISTEL_KEYS:
+        f = (((right ^ key) * 0x9E3779B1) >> 12) & _FEISTEL_MASK
+        left, right = right, left ^ f
+    return (left << _FEISTEL_HALF_BITS) | right
+
+
+def encode_slug(url_id: int) -> str:
+    if not 0 <= url_id < 1 << SLUG_ID_BITS:
+        raise ValueError(f"URL id out of slug range: {url_id}")
+    n = _feistel(url_id)
+    chars = []
+    for _ in range(SLUG_LENGTH):
+        n, r = divmod(n, 62)
+        chars.append(BASE62_ALPHABET[r])
+    return "".join(reversed(chars))
 
 
 def build_tinyurl(slug: str):
-    return request.url_root + slug
+    # url_root is rebuilt from the WSGI environ on every access
+    if (url_root := g.get("url_root")) is None:
+        url_root = g.url_root = request.url_root
+    return url_root + slug
+
+
+def build_links(slug: str) -> dict[str, str]:
+    # string building instead of url_for, keep in sync with the /urls/<slug> routes
+    stats_url = build_tinyurl(f"urls/{slug}")
+    return {"redirect": build_tinyurl(slug), "stats": stats_url, "delete": stats_url}
+
+
+def dumps_json(obj: Any) -> bytes:
+    # same output as jsonify (sorted keys, HTTP dates) but serialized by orjson
+    return orjson.dumps(
+        obj,
+        default=http_date,
+        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SORT_KEYS,
+    )
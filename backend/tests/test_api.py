@@ -2,6 +2,7 @@ from http import HTTPStatus
 
 import pytest
 
+from src import access_logs
 from src.app import app
 
 
@@ -34,6 +35,7 @@ def test_url_lifecycle(client):
     assert resp.status_code in (HTTPStatus.FOUND, HTTPStatus.MOVED_PERMANENTLY, 302)
     assert "Location" in resp.headers
     assert resp.headers["Location"] == original_url
+    access_logs.flush()
 
     # STATS
     resp = client.get(f"/urls/{slug}")
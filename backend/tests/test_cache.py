@@ -0,0 +1,79 @@
+import pytest
+import redis
+
+from src import cache
+
+
+class FakeRedis:
+    """Just the get/set subset the cache uses, ttls are recorded not enforced"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        self.ttls[key] = ex
+        return True
+
+
+class DownRedis:
+    def get(self, key):
+        raise redis.ConnectionError("down")
+
+    def set(self, key, value, ex=None, nx=False):
+        raise redis.TimeoutError("stalled")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(cache, "client", client)
+    return client
+
+
+def test_cache_roundtrip(client):
+    assert cache.get_url("abc") is None
+    cache.set_url("abc", 1, "https://example.com/a|b", None)
+    assert cache.get_url("abc") == (1, "https://example.com/a|b")
+    assert client.ttls["url:abc"] == cache.CACHE_TTL
+
+
+def test_cache_ttl_capped_at_expiry(client):
+    cache.set_url("abc", 1, "https://example.com/", 30)
+    assert client.ttls["url:abc"] == 30
+
+
+@pytest.mark.parametrize("expires_in", [0, -5])
+def test_cache_skips_expired(client, expires_in):
+    cache.set_url("abc", 1, "https://example.com/", expires_in)
+    assert client.data == {}
+
+
+def test_cache_delete_tombstone(client):
+    cache.set_url("abc", 1, "https://example.com/", None)
+    cache.delete_url("abc")
+    # late set from a redirect that read the row before the delete
+    cache.set_url("abc", 1, "https://example.com/", None)
+    assert client.data["url:abc"] == cache.DELETED
+    assert client.ttls["url:abc"] == cache.DELETED_TTL
+    assert cache.get_url("abc") is None
+
+
+def test_cache_errors_are_misses(monkeypatch):
+    monkeypatch.setattr(cache, "client", DownRedis())
+    assert cache.get_url("abc") is None
+    cache.set_url("abc", 1, "https://example.com/", None)
+    cache.delete_url("abc")
+
+
+def test_cache_disabled(monkeypatch):
+    monkeypatch.setattr(cache, "client", None)
+    cache.set_url("abc", 1, "https://example.com/", None)
+    assert cache.get_url("abc") is None
+    cache.delete_url("abc")
@@ -0,0 +1,138 @@
+import pytest
+
+from src import utils
+from src.utils import (
+    MAX_URL_LENGTH,
+    SLUG_ID_BITS,
+    SLUG_LENGTH,
+    encode_slug,
+    normalize_url,
+)
+
+
+@pytest.fixture
+def spy(monkeypatch):
+    """Empty the normalize_url cache and record the urls passed to a utils function"""
+    utils._normalize_url.cache_clear()
+
+    def spy_on(name):
+        calls = []
+        wrapped = getattr(utils, name)
+
+        def record(url):
+            calls.append(url)
+            return wrapped(url)
+
+        monkeypatch.setattr(utils, name, record)
+        return calls
+
+    yield spy_on
+    utils._normalize_url.cache_clear()
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("HTTPS://Example.COM/Path?b=2&a=1", "https://example.com/Path?a=1&b=2"),
+        ("http://Example.com", "http://example.com/"),
+        ("http://Example.com?b=1", "http://example.com/?b=1"),
+        ("http://a.com/p#x?y", "http://a.com/p#x?y"),
+        ("http://A.com/p?b#frag", "http://a.com/p?b#frag"),
+        ("http://A.com/p?#", "http://a.com/p"),
+        ("https://User:PW@Host:8080/x?q", "https://user:pw@host:8080/x?q"),
+        ("https://A.com/p;x?q", "https://a.com/p;x?q"),
+        # urlunparse drops an empty ;params from the last segment only
+        ("https://A.com/p;", "https://a.com/p"),
+        ("https://A.com/a;/b;?q", "https://a.com/a;/b?q"),
+        ("https://A.com/p;;", "https://a.com/p;;"),
+    ],
+)
+def test_normalize_url_scan(spy, url, expected):
+    parsed_calls = spy("_normalize_parsed_url")
+    assert normalize_url(url) == expected
+    assert parsed_calls == []
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("Example.com/x?b&a", "http://example.com/x?a&b"),
+        ("ftp://Example.com/x", "ftp://example.com/x"),
+        ("http://[FE80::1]:80/x", "http://[fe80::1]:80/x"),
+        ("https://Bücher.de/x", "https://bücher.de/x"),
+        ("https://A.com/\tb?q", "https://a.com/b?q"),
+    ],
+)
+def test_normalize_url_fallback(spy, url, expected):
+    parsed_calls = spy("_normalize_parsed_url")
+    assert normalize_url(url) == expected
+    assert parsed_calls == [url]
+
+
+@pytest.mark.parametrize(
+    "url, fast",
+    [
+        ("https://example.com/path", True),
+        ("https://Example.COM/path", False),
+        ("https://example.com", True),
+        ("http://Example.com", False),
+        ("https://user:pw@example.com/x", True),
+        ("https://User@example.com/x", False),
+        ("http://example.com:8080/x", True),
+        ("https://example.com/x ", False),
+        ("https://example.com/p;", False),
+    ],
+)
+def test_normalize_url_fast_path(spy, url, fast):
+    expected = utils._normalize_scanned_url(url)
+    scanned_calls = spy("_normalize_scanned_url")
+    assert normalize_url(url) == expected
+    assert scanned_calls == ([] if fast else [url])
+
+
+@pytest.mark.parametrize("url", ["http:///path", "http://?q", "http://[::1/x"])
+def test_normalize_url_malformed(url):
+    with pytest.raises(ValueError):
+        normalize_url(url)
+
+
+def test_normalize_url_long_not_cached(spy):
+    pairs = [f"utm_{i}=x" for i in range(1000)]
+    url = "https://Example.com/?" + "&".join(pairs)
+    assert len(url) > MAX_URL_LENGTH
+    assert normalize_url(url) == "https://example.com/?" + "&".join(sorted(pairs))
+    assert utils._normalize_url.cache_info().currsize == 0
+    normalize_url("https://Example.com/")
+    assert utils._normalize_url.cache_info().currsize == 1
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("b=2&a=1", "a=1&b=2"),
+        ("a=1&&b=2&", "a=1&b=2"),
+        ("c&a=", "a=&c"),
+        ("q=a%20b", "q=a%20b"),
+        ("q=a+b", "q=a+b"),
+        ("q=%7e", "q=%7e"),
+        ("a=1;b=2", "a=1;b=2"),
+        ("a=1&a-b=1", "a-b=1&a=1"),
+        ("", ""),
+    ],
+)
+def test_order_query(query, expected):
+    assert utils.order_query(query) == expected
+
+
+def test_encode_slug_unique_fixed_length():
+    slugs = {encode_slug(url_id) for url_id in range(50_000)}
+    assert len(slugs) == 50_000
+    assert {len(slug) for slug in slugs} == {SLUG_LENGTH}
+
+
+def test_encode_slug_range():
+    assert len(encode_slug((1 << SLUG_ID_BITS) - 1)) == SLUG_LENGTH
+    with pytest.raises(ValueError):
+        encode_slug(1 << SLUG_ID_BITS)
+    with pytest.raises(ValueError):
+        encode_slug(-1)